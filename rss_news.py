@@ -1,13 +1,31 @@
 """
 Модуль для работы с RSS-лентами новостей.
-Использует feedparser и BeautifulSoup для парсинга RSS и извлечения текста.
+RSS 2.0 разбирается потоково (xml.etree), feedparser — запасной вариант для остальных лент;
+selectolax (или BeautifulSoup) используется для извлечения текста.
 """
+from __future__ import annotations
 
+import asyncio
+import base64
+import contextlib
+import functools
+import os
 import re
-import requests
+import threading
 import urllib.parse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Пытаемся импортировать feedparser и BeautifulSoup
+# Пытаемся импортировать feedparser, selectolax и BeautifulSoup
 try:
     import feedparser
     HAS_FEEDPARSER = True
@@ -20,63 +38,286 @@ try:
 except ImportError:
     HAS_BEAUTIFULSOUP = False
 
+# selectolax (lexbor, C) парсит HTML в разы быстрее BeautifulSoup; bs4 остаётся запасным вариантом
+try:
+    from selectolax.parser import HTMLParser
+    HAS_SELECTOLAX = True
+except ImportError:
+    HAS_SELECTOLAX = False
+
+try:
+    import requests_cache
+    HAS_REQUESTS_CACHE = True
+except ImportError:
+    HAS_REQUESTS_CACHE = False
+
+try:
+    from diskcache import Cache
+    HAS_DISKCACHE = True
+except ImportError:
+    HAS_DISKCACHE = False
+
+# httpx (ставится вместе с python-telegram-bot) нужен для асинхронного API модуля
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+# Сколько редиректов Google News резолвим параллельно внутри одной ленты
+RESOLVE_WORKERS = 8
+
+_BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+# HTTP-кэш лент и редиректов (sqlite), живёт рядом с проектом
+HTTP_CACHE_PATH = Path(__file__).parent / ".cache" / "rss_cache"
+HTTP_CACHE_TTL = 600  # секунд
+
+
+def _build_session() -> requests.Session:
+    """
+    Создаёт общую сессию для всех запросов модуля.
+    Пул соединений переиспользует TCP/TLS между запросами и потоками,
+    а при наличии requests_cache на HTTP_CACHE_TTL секунд кэшируются шаги редиректов Google News
+    (HEAD-ответы 3xx в _follow_redirects). Ленты и статьи запрашиваются с DO_NOT_CACHE.
+    """
+    if HAS_REQUESTS_CACHE:
+        session = requests_cache.CachedSession(
+            str(HTTP_CACHE_PATH),
+            backend="sqlite",
+            expire_after=HTTP_CACHE_TTL,
+            allowable_codes=(200, 301, 302, 303, 307, 308),
+        )
+    else:
+        session = requests.Session()
+    
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.2))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = _build_session()
+
+# Предел переходов при ручном разборе цепочки редиректов Google News
+MAX_REDIRECT_HOPS = 5
+
+# Найденные редиректами оригиналы ссылок Google News: {ссылка Google News: URL статьи}.
+# Самые старые записи вытесняются после REDIRECT_CACHE_MAX
+REDIRECT_CACHE_MAX = 4096
+_REDIRECT_CACHE: dict[str, str] = {}
+_REDIRECT_CACHE_LOCK = threading.Lock()
+
+# Регулярные выражения компилируем один раз на модуль
+_URL_RE = re.compile(r'https?://[^\s<>"\'\)]+')
+_TAG_RE = re.compile(r'<[^>]+>')
+_WS_RE = re.compile(r'\s+')
+
+# Заголовки служебных сообщений Google News («источник недоступен» и т.п.)
+_SKIP_TITLE_TOKENS = ("недоступен", "unavailable")
+
+# Хосты, ссылки на которые не считаются оригиналом статьи.
+# Поддомены (news.google.com, www.google.com) ловятся проходом по суффиксам в _is_bad_url
+_BAD_HOSTS = frozenset({"google.com", "gstatic.com"})
+
+# Сколько первых байт ленты смотрим, чтобы отличить Atom (<feed) от RSS (<rss)
+FEED_SNIFF_BYTES = 256
+
+# Валидаторы последнего ответа ленты для условного GET:
+# {rss_url: (etag, last_modified, limit, разобранные записи)}
+_FEED_META: dict[str, tuple[str | None, str | None, int, list[dict]]] = {}
+
+# Не больше стольких параграфов на страницу: патологические страницы не раздувают разбор
+MAX_PARAGRAPHS = 200
+
+# Дисковый кэш текстов статей: ключ — URL + день, TTL в секундах из ARTICLE_CACHE_TTL.
+# Сбросить кэш — удалить каталог ARTICLE_CACHE_PATH
+ARTICLE_CACHE_PATH = Path(__file__).parent / ".cache" / "bodies"
+ARTICLE_CACHE_TTL = int(os.getenv("ARTICLE_CACHE_TTL", "86400"))
+_BODY_CACHE = Cache(str(ARTICLE_CACHE_PATH)) if HAS_DISKCACHE else None
+
+# Предел одновременных соединений асинхронного клиента
+ASYNC_MAX_CONNECTIONS = 50
+
+# Сколько байт страницы читаем в fetch_article_body (текст всё равно режется до 10000 символов)
+MAX_ARTICLE_BYTES = 512 * 1024
+
+
+class Article(NamedTuple):
+    """
+    Новость из RSS-ленты. Компактный кортеж вместо dict на каждую запись.
+    Для кода, который раньше получал dict, поддерживает чтение как из словаря:
+    article["title"], article.get("title"), "title" in article, keys()/values()/items() и dict(article).
+    Отличия от dict: итерация и распаковка идут по значениям (это кортеж), а json.dumps(article)
+    даёт список — для JSON нужен article._asdict().
+    """
+    title: str
+    summary: str
+    link: str
+    published: str
+    published_dt: datetime | None = None
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self._fields else default
+    
+    def __contains__(self, key) -> bool:
+        if isinstance(key, str):
+            return key in self._fields
+        return tuple.__contains__(self, key)
+    
+    def keys(self) -> tuple[str, ...]:
+        return self._fields
+    
+    def values(self) -> tuple[Any, ...]:
+        return tuple(self)
+    
+    def items(self) -> list[tuple[str, Any]]:
+        return list(zip(self._fields, self))
+
+
+def _is_bad_url(u: str) -> bool:
+    """Ведёт ли ссылка на Google/gstatic: хост разбирается один раз и сверяется с _BAD_HOSTS."""
+    try:
+        host = urllib.parse.urlsplit(u).hostname or ""
+    except ValueError:
+        return True
+    while host:
+        if host in _BAD_HOSTS:
+            return True
+        dot = host.find('.')
+        if dot == -1:
+            return False
+        host = host[dot + 1:]
+    return False
+
+
+def _is_article_url(u: str) -> bool:
+    """
+    Похожа ли ссылка на статью, а не просто на домен: есть путь после хоста
+    и длина больше 20 символов. Путь ищем через find, без копии строки.
+    """
+    return len(u) > 20 and u.find('/', u.find('://') + 3) != -1
+
+
+def _decode_gnews_article(google_news_url: str) -> str | None:
+    """
+    Декодирует оригинальный URL из пути Google News /articles/<id>.
+    id — urlsafe base64 от protobuf, в котором URL статьи лежит открытым текстом
+    (старый формат CBMi...). Для новых непрозрачных id возвращает None.
+    """
+    path = urllib.parse.urlsplit(google_news_url).path
+    marker = path.find("/articles/")
+    if marker == -1:
+        return None
+    segment = path[marker + len("/articles/"):].split("/", 1)[0]
+    if not segment:
+        return None
+    
+    try:
+        payload = base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+    except ValueError:
+        return None
+    
+    start = payload.find(b"http")
+    if start == -1:
+        return None
+    # URL тянется до первого непечатаемого байта (дальше идут служебные поля protobuf)
+    end = start
+    while end < len(payload) and 0x21 <= payload[end] < 0x7f:
+        end += 1
+    url = payload[start:end].decode("ascii")
+    
+    if _is_bad_url(url) or not _is_article_url(url):
+        return None
+    return url
+
 
 def extract_original_url(google_news_url: str) -> str:
     """
     Достаёт оригинальный URL из ссылки Google News.
     Пытается извлечь реальную ссылку на статью из параметров URL или через редирект.
+    Результаты кэшируются: одна и та же ссылка часто встречается в нескольких лентах.
+    Из сетевых результатов в кэш попадают только найденные адреса: после таймаута
+    или ошибки следующий вызов снова пойдёт в сеть.
+    """
+    final_url = _extract_local(google_news_url)
+    if final_url:
+        return final_url
+    
+    final_url = _REDIRECT_CACHE.get(google_news_url)
+    if final_url:
+        return final_url
+    
+    # Если не нашли в параметрах и не декодировали, пытаемся следовать редиректу
+    final_url = _follow_redirects(google_news_url)
+    if final_url:
+        with _REDIRECT_CACHE_LOCK:
+            if len(_REDIRECT_CACHE) >= REDIRECT_CACHE_MAX:
+                _REDIRECT_CACHE.pop(next(iter(_REDIRECT_CACHE)))
+            _REDIRECT_CACHE[google_news_url] = final_url
+        return final_url
+    
+    return google_news_url
+
+
+@functools.lru_cache(maxsize=4096)
+def _extract_local(google_news_url: str) -> str | None:
+    """
+    Достаёт оригинальный URL из ссылки Google News без сетевых запросов:
+    параметры url/article, вложенные ссылки и base64-id из /articles/.
+    Возвращает None, если без сети URL не найти.
     """
     try:
-        # Парсим URL
-        parsed = urllib.parse.urlparse(google_news_url)
-        query_params = urllib.parse.parse_qs(parsed.query)
-        
-        # Google News часто хранит ссылку в параметре 'url'
-        if 'url' in query_params:
-            url = query_params['url'][0]
-            if url and not url.startswith('http'):
-                url = 'https://' + url.lstrip('/')
-            if url and 'google.com' not in url:
-                return url
+        # Google News часто хранит ссылку в параметре 'url', реже — в 'article'.
+        # Идём по парам parse_qsl и останавливаемся, как только нашли оба (берём первые значения)
+        url_param = article_param = None
+        for key, value in urllib.parse.parse_qsl(urllib.parse.urlsplit(google_news_url).query):
+            if key == 'url' and url_param is None:
+                url_param = value
+            elif key == 'article' and article_param is None:
+                article_param = value
+            else:
+                continue
+            if url_param is not None and article_param is not None:
+                break
         
-        # Также проверяем параметр 'article'
-        if 'article' in query_params:
-            url = query_params['article'][0]
+        for url in (url_param, article_param):
             if url and not url.startswith('http'):
                 url = 'https://' + url.lstrip('/')
             if url and 'google.com' not in url:
                 return url
         
-        # Декодируем URL и ищем ссылки в декодированной строке
+        # Декодируем URL и ищем вложенные ссылки в декодированной строке.
+        # Сама ссылка Google News начинается с http, поэтому сканируем regex-ом,
+        # только если где-то дальше есть ещё одно вхождение http
         decoded = urllib.parse.unquote(google_news_url)
+        if decoded.find('http', 1) != -1:
+            # Выбираем первую НЕ google.com ссылку
+            for u in _URL_RE.findall(decoded):
+                if not _is_bad_url(u):
+                    # Очищаем URL от лишних символов
+                    u = u.rstrip('.,;:!?)')
+                    if _is_article_url(u):
+                        return u
         
-        # Паттерн всех http/https ссылок
-        urls = re.findall(r'https?://[^\s<>"\'\)]+', decoded)
-        
-        # Выбираем первую НЕ google.com ссылку
-        for u in urls:
-            if "news.google.com" not in u and "google.com" not in u and "gstatic.com" not in u:
-                # Очищаем URL от лишних символов
-                u = u.rstrip('.,;:!?)')
-                # Проверяем, что это не просто домен, а полный путь к статье
-                if '/' in u.replace('://', '') and len(u) > 20:
-                    return u
-        
-        # Если не нашли в параметрах, пытаемся следовать редиректу
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            response = requests.get(google_news_url, headers=headers, timeout=5, allow_redirects=True)
-            final_url = response.url
-            if 'google.com' not in final_url and 'news.google.com' not in final_url:
-                return final_url
-        except:
-            pass
+        # Ссылки вида /articles/<base64> содержат оригинальный URL — декодируем локально, без сети
+        final_url = _decode_gnews_article(google_news_url)
+        if final_url:
+            return final_url
         
-        return google_news_url
+        return None
     except Exception as e:
-        return google_news_url
+        return None
 
 
 def clean_html(raw_html: str) -> str:
@@ -86,6 +327,12 @@ def clean_html(raw_html: str) -> str:
     if not raw_html:
         return ""
     
+    if HAS_SELECTOLAX:
+        try:
+            return HTMLParser(raw_html).text(separator=" ", strip=True)
+        except Exception:
+            pass
+    
     if HAS_BEAUTIFULSOUP:
         try:
             soup = BeautifulSoup(raw_html, "html.parser")
@@ -93,14 +340,264 @@ def clean_html(raw_html: str) -> str:
         except:
             pass
     
-    # Если BeautifulSoup не установлен, используем простую замену
-    import re
-    text = re.sub(r'<[^>]+>', ' ', raw_html)
-    text = re.sub(r'\s+', ' ', text)
+    # Если HTML-парсеры не установлены, используем простую замену
+    text = _TAG_RE.sub(' ', raw_html)
+    text = _WS_RE.sub(' ', text)
     return text.strip()
 
 
-def fetch_rss_entries(rss_url: str, limit: int = 5) -> list[dict]:
+def _follow_redirects(url: str, max_hops: int = MAX_REDIRECT_HOPS) -> str | None:
+    """
+    Проходит цепочку редиректов HEAD-запросами, не скачивая тела страниц.
+    Останавливается на первом адресе вне Google или после max_hops переходов.
+    Возвращает найденный URL вне Google, иначе None.
+    """
+    for _ in range(max_hops):
+        try:
+            response = SESSION.head(url, headers=_BROWSER_HEADERS, timeout=3, allow_redirects=False)
+        except Exception:
+            return None
+        
+        location = response.headers.get("Location")
+        if not location:
+            return None
+        
+        # Location может быть относительным
+        url = urllib.parse.urljoin(url, location)
+        if not _is_bad_url(url):
+            return url
+    
+    return None
+
+
+def _parse_pubdate(value: str) -> datetime | None:
+    """
+    Быстрый разбор даты публикации без feedparser: RFC 822 (pubDate в RSS),
+    затем ISO 8601 (Atom). Возвращает None, если строку разобрать не удалось.
+    """
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        pass
+    value = value.strip()
+    # До Python 3.11 fromisoformat не понимает суффикс Z, который есть почти у всех дат Atom
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def _drain_rss_items(parser: ET.XMLPullParser, items: list[dict], limit: int) -> bool:
+    """
+    Забирает из парсера готовые элементы <item> в items.
+    Возвращает True, когда набрано limit записей и дальше ленту читать не нужно.
+    """
+    for _, elem in parser.read_events():
+        if elem.tag != "item":
+            continue
+        source = elem.find("source")
+        items.append({
+            "title": elem.findtext("title") or "",
+            "link": elem.findtext("link") or "",
+            "summary": elem.findtext("description") or "",
+            "published": elem.findtext("pubDate") or "",
+            "source_href": source.get("url") if source is not None else None,
+        })
+        # Разобранный item больше не нужен — освобождаем дерево
+        elem.clear()
+        if len(items) >= limit:
+            return True
+    return False
+
+
+def _parse_rss_items(chunks, limit: int) -> list[dict]:
+    """
+    Потоково разбирает RSS 2.0 и возвращает первые limit элементов <item>.
+    Остаток ленты не читается и не разбирается.
+    
+    Returns:
+        Список словарей: title, link, summary, published, source_href.
+    """
+    parser = ET.XMLPullParser(events=("end",))
+    items = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        if _drain_rss_items(parser, items, limit):
+            break
+    return items
+
+
+def _parse_feedparser_items(body: bytes, limit: int) -> list[dict]:
+    """Разбор ленты через feedparser (Atom и «кривые» ленты); формат как у _parse_rss_items."""
+    feed = feedparser.parse(body)
+    items = []
+    for entry in feed.entries[:limit]:
+        source = entry.get("source") or {}
+        items.append({
+            "title": entry.get("title", ""),
+            "link": entry.get("link", ""),
+            "summary": entry.get("summary", ""),
+            "published": entry.get("published", ""),
+            "source_href": source.get("href"),
+        })
+    return items
+
+
+def _feed_request_headers(rss_url: str, limit: int) -> dict:
+    """
+    Заголовки запроса ленты. Если лента уже скачивалась (и разобрана хотя бы на limit записей),
+    добавляем If-None-Match / If-Modified-Since: на неизменённую ленту сервер ответит 304 без тела.
+    """
+    headers = dict(_BROWSER_HEADERS)
+    meta = _FEED_META.get(rss_url)
+    if meta and limit <= meta[2]:
+        etag, last_modified = meta[0], meta[1]
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _remember_feed(rss_url: str, response_headers, limit: int, items: list[dict]) -> None:
+    """Запоминает валидаторы ответа и разобранные записи для следующего условного запроса."""
+    etag = response_headers.get("ETag")
+    last_modified = response_headers.get("Last-Modified")
+    if etag or last_modified:
+        _FEED_META[rss_url] = (etag, last_modified, limit, items)
+    else:
+        _FEED_META.pop(rss_url, None)
+
+
+def _read_feed_stream(chunks, limit: int) -> list[dict]:
+    """
+    Разбирает только первые limit записей из потока байт ленты.
+    Формат определяется по первым FEED_SNIFF_BYTES байтам: Atom сразу уходит в feedparser,
+    RSS 2.0 (Google News) — в потоковый парсер. Если потоковый парсер не справился
+    (битый XML или нет <item>), лента дочитывается и отдаётся feedparser.
+    """
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= FEED_SNIFF_BYTES:
+            break
+    
+    if b"<feed" in head[:FEED_SNIFF_BYTES]:
+        if not HAS_FEEDPARSER:
+            return []
+        return _parse_feedparser_items(head + b"".join(chunks), limit)
+    
+    seen = [head]
+    
+    def tee():
+        yield head
+        for chunk in chunks:
+            seen.append(chunk)
+            yield chunk
+    
+    try:
+        items = _parse_rss_items(tee(), limit)
+    except ET.ParseError:
+        items = []
+    if items or not HAS_FEEDPARSER:
+        return items
+    
+    return _parse_feedparser_items(b"".join(seen) + b"".join(chunks), limit)
+
+
+def _fetch_feed_items(rss_url: str, limit: int) -> list[dict]:
+    """Скачивает ленту потоком (условным GET, если она уже скачивалась) и разбирает первые limit записей."""
+    headers = _feed_request_headers(rss_url, limit)
+    # Ленту не кладём в HTTP-кэш: requests_cache дочитал бы её целиком до разбора первых limit записей.
+    # Повторные запросы и так дешёвые — условный GET по _FEED_META
+    cache_kwargs = {"expire_after": requests_cache.DO_NOT_CACHE} if HAS_REQUESTS_CACHE else {}
+    with SESSION.get(rss_url, headers=headers, timeout=10, stream=True, **cache_kwargs) as resp:
+        meta = _FEED_META.get(rss_url)
+        if resp.status_code == 304 and meta:
+            return meta[3][:limit]
+        resp.raise_for_status()
+        items = _read_feed_stream(resp.iter_content(16384), limit)
+        _remember_feed(rss_url, resp.headers, limit, items)
+        return items
+
+
+def _build_articles(items: list[dict]) -> tuple[list[Article], list[tuple[int, str]]]:
+    """
+    Первый проход: превращает сырые записи ленты в статьи и ищет реальную ссылку
+    без сетевых запросов. Ссылки, которым нужен редирект, возвращаются отдельно,
+    чтобы резолвить их все разом.
+    
+    Returns:
+        (статьи, [(индекс статьи, ссылка Google News для редиректа)])
+    """
+    articles = []
+    pending = []  # (индекс в articles, ссылка Google News для редиректа)
+    for entry in items:
+        title = entry["title"].strip()
+        # Пропускаем служебные сообщения Google News
+        title_lower = title.lower()
+        if any(token in title_lower for token in _SKIP_TITLE_TOKENS):
+            continue
+        
+        summary = entry["summary"].strip()
+        published = entry["published"]
+        
+        # КЛЮЧЕВОЕ МЕСТО: реальная ссылка в <source url="..."> (entry.source.href у feedparser)
+        link = entry["link"].strip()
+        real_url = None
+        
+        # Приоритет 1: source.href (если доступен)
+        source_href = entry["source_href"]
+        if source_href and 'google.com' not in source_href:
+            real_url = source_href
+        
+        # Приоритет 2: извлекаем из link, если это Google News ссылка
+        if not real_url and ("news.google.com" in link or "google.com/news" in link):
+            real_url = _extract_local(link)
+        
+        # Приоритет 3: если link не Google News, используем его
+        if not real_url and link and "google.com" not in link:
+            real_url = link
+        
+        # Приоритет 4: ищем ссылки в summary/description
+        if (not real_url or "news.google.com" in real_url or "google.com/news" in real_url) and 'http' in summary:
+            for u in _URL_RE.findall(summary):
+                u = u.rstrip('.,;:!?)')
+                if not _is_bad_url(u) and _is_article_url(u):
+                    real_url = u
+                    break
+        
+        # Очищаем summary от HTML
+        clean_summary = clean_html(summary)
+        
+        # Если все еще не нашли или это Google News — откладываем редирект до второго прохода
+        if (not real_url or "news.google.com" in real_url or "google.com/news" in real_url) and link:
+            pending.append((len(articles), link))
+        
+        articles.append(Article(
+            title=title,
+            summary=clean_summary,
+            link=real_url or link,
+            published=published,
+            published_dt=_parse_pubdate(published),
+        ))
+    
+    return articles, pending
+
+
+def _apply_redirects(articles: list[Article], pending: list[tuple[int, str]], resolved: dict[str, str | None]) -> None:
+    """Второй проход: записывает найденные редиректами ссылки обратно в статьи по индексу."""
+    for idx, link in pending:
+        final_url = resolved.get(link)
+        if final_url:
+            articles[idx] = articles[idx]._replace(link=final_url)
+
+
+def fetch_rss_entries(rss_url: str, limit: int = 5) -> list[Article]:
     """
     Забирает записи из RSS-ленты Google News.
     
@@ -109,116 +606,313 @@ def fetch_rss_entries(rss_url: str, limit: int = 5) -> list[dict]:
         limit: Максимальное количество новостей для возврата
     
     Returns:
-        Список словарей: title, summary, link (реальный URL из source.href), published.
+        Список Article: title, summary, link (реальный URL из source.href), published
+        и published_dt (datetime или None).
     """
-    if not HAS_FEEDPARSER:
-        # Если feedparser не установлен, возвращаем пустой список
-        return []
-    
     try:
-        feed = feedparser.parse(rss_url)
+        items = _fetch_feed_items(rss_url, limit)
+        articles, pending = _build_articles(items)
         
-        articles = []
-        for entry in feed.entries[:limit]:
-            title = entry.get("title", "").strip()
-            # Пропускаем служебные сообщения Google News
-            if "недоступен" in title.lower() or "unavailable" in title.lower():
-                continue
-            
-            summary = entry.get("summary", "").strip()
-            published = entry.get("published", "")
-            
-            # КЛЮЧЕВОЕ МЕСТО: реальная ссылка в entry.source.href
-            link = entry.get("link", "").strip()
-            real_url = None
-            
-            # Приоритет 1: entry.source.href (если доступен)
-            if hasattr(entry, "source") and hasattr(entry.source, "href"):
-                source_href = entry.source.href
-                if source_href and 'google.com' not in source_href:
-                    real_url = source_href
-            
-            # Приоритет 2: извлекаем из link, если это Google News ссылка
-            if not real_url and ("news.google.com" in link or "google.com/news" in link):
-                real_url = extract_original_url(link)
-            
-            # Приоритет 3: если link не Google News, используем его
-            if not real_url and link and "google.com" not in link:
-                real_url = link
-            
-            # Приоритет 4: ищем ссылки в summary/description
-            if (not real_url or "news.google.com" in real_url or "google.com/news" in real_url) and summary:
-                urls = re.findall(r'https?://[^\s<>"\'\)]+', summary)
-                for u in urls:
-                    u = u.rstrip('.,;:!?)')
-                    if ('google.com' not in u and 
-                        'news.google.com' not in u and
-                        'gstatic.com' not in u and
-                        '/' in u.replace('://', '') and  # Проверяем, что это не просто домен
-                        len(u) > 20):  # Минимальная длина для реальной статьи
-                        real_url = u
-                        break
-            
-            # Если все еще не нашли или это Google News, пытаемся следовать редиректу
-            if (not real_url or "news.google.com" in real_url or "google.com/news" in real_url) and link:
-                try:
-                    headers = {
-                        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                    }
-                    response = requests.head(link, headers=headers, timeout=5, allow_redirects=True)
-                    final_url = response.url
-                    if 'google.com' not in final_url and 'news.google.com' not in final_url:
-                        real_url = final_url
-                except:
-                    pass
-            
-            # Последний вариант: используем link как есть
-            if not real_url:
-                real_url = link
-            
-            # Очищаем summary от HTML
-            clean_summary = clean_html(summary)
-            
-            articles.append({
-                "title": title,
-                "summary": clean_summary,
-                "link": real_url,
-                "published": published,
-            })
+        # Второй проход: все редиректы (без повторов) резолвим параллельно —
+        # задержка ленты равна самому долгому запросу, а не их сумме.
+        # extract_original_url кэширует результат, повторные обновления ленты сеть не трогают
+        if pending:
+            links = list(dict.fromkeys(link for _, link in pending))
+            with ThreadPoolExecutor(max_workers=min(len(links), RESOLVE_WORKERS)) as pool:
+                results = pool.map(extract_original_url, links)
+                resolved = {link: url for link, url in zip(links, results) if url != link}
+            _apply_redirects(articles, pending, resolved)
         
         return articles
     except Exception as e:
         return []
 
 
+def fetch_many_rss(urls: list[str], limit: int = 5, workers: int = 4) -> list[list[Article]]:
+    """
+    Забирает несколько RSS-лент параллельно.
+    
+    Args:
+        urls: Список URL RSS-лент
+        limit: Максимальное количество новостей на ленту
+        workers: Размер пула потоков
+    
+    Returns:
+        Списки новостей в том же порядке, что и urls (см. fetch_rss_entries).
+    """
+    if not urls:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls)))) as pool:
+        return list(pool.map(lambda url: fetch_rss_entries(url, limit), urls))
+
+
+def _iter_descendants(root, tag: str):
+    """
+    Узлы selectolax с тегом tag внутри root в порядке документа. Генератор: в отличие от root.css(tag),
+    который строит список всех совпадений, обход останавливается, как только вызывающему хватит узлов.
+    """
+    stack = [root.child] if root.child is not None else []
+    while stack:
+        node = stack.pop()
+        if node.next is not None:
+            stack.append(node.next)
+        if node.tag == tag:
+            yield node
+        if node.child is not None:
+            stack.append(node.child)
+
+
+def _article_text(html: str) -> str:
+    """
+    Текст параграфов статьи, не длиннее 10000 символов; пустая строка, если текста мало.
+    Параграфы ищутся внутри <article>/<main> (так обходится меньше узлов и меньше мусора),
+    а если там текста не набралось — по всей странице. Не больше MAX_PARAGRAPHS параграфов.
+    """
+    if HAS_SELECTOLAX:
+        tree = HTMLParser(html)
+        scope = tree.css_first("article") or tree.css_first("main")
+        roots = [scope, tree.root] if scope is not None else [tree.root]
+
+        def paragraphs_of(root):
+            if root is None:
+                return []
+            return [p.text(strip=True) for p in islice(_iter_descendants(root, "p"), MAX_PARAGRAPHS)]
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+        scope = soup.find("article") or soup.find("main")
+        roots = [scope, soup] if scope is not None else [soup]
+
+        def paragraphs_of(root):
+            return [p.get_text(strip=True) for p in root.find_all("p", limit=MAX_PARAGRAPHS)]
+    
+    for root in roots:
+        text = "\n".join(paragraphs_of(root))
+        # Ограничиваем длину
+        if text and len(text) > 100:
+            return text[:10000]
+    
+    return ""
+
+
+def _body_cache_key(url: str) -> tuple[str, str]:
+    return (url, date.today().isoformat())
+
+
+def _body_cache_get(url: str) -> str | None:
+    if _BODY_CACHE is None:
+        return None
+    try:
+        return _BODY_CACHE.get(_body_cache_key(url))
+    except Exception:
+        return None
+
+
+def _body_cache_set(url: str, text: str) -> None:
+    # Пустой результат (ошибка сети, мало текста) не кэшируем — попробуем в следующий раз
+    if _BODY_CACHE is None or not text:
+        return
+    try:
+        _BODY_CACHE.set(_body_cache_key(url), text, expire=ARTICLE_CACHE_TTL)
+    except Exception:
+        pass
+
+
 def fetch_article_body(url: str) -> str:
     """
     Извлекает основной текст статьи с веб-страницы.
     Получает текст всех параграфов из HTML.
+    Результат кэшируется на диске (см. ARTICLE_CACHE_TTL), повторная генерация поста сеть не трогает.
     """
-    if not HAS_BEAUTIFULSOUP:
+    text = _body_cache_get(url)
+    if text is None:
+        text = _fetch_article_body(url)
+        _body_cache_set(url, text)
+    return text
+
+
+def _fetch_article_body(url: str) -> str:
+    """Скачивание и разбор статьи для fetch_article_body (без кэша)."""
+    if not HAS_SELECTOLAX and not HAS_BEAUTIFULSOUP:
         return ""
     
+    # Тело статьи не кладём в HTTP-кэш: иначе requests_cache дочитает ответ целиком
+    cache_kwargs = {"expire_after": requests_cache.DO_NOT_CACHE} if HAS_REQUESTS_CACHE else {}
     try:
-        resp = requests.get(url, timeout=10, headers={
+        with SESSION.get(url, timeout=10, stream=True, headers={
             "User-Agent": "Mozilla/5.0"
-        })
-        resp.raise_for_status()
+        }, **cache_kwargs) as resp:
+            resp.raise_for_status()
+            # Читаем не больше MAX_ARTICLE_BYTES и закрываем соединение
+            chunks = []
+            total = 0
+            for chunk in resp.iter_content(8192):
+                chunks.append(chunk)
+                total += len(chunk)
+                if total >= MAX_ARTICLE_BYTES:
+                    break
+            html = b"".join(chunks).decode(resp.encoding or "utf-8", "replace")
     except Exception as e:
         return ""
     
     try:
-        soup = BeautifulSoup(resp.text, "html.parser")
-        
-        # Берём текст всех параграфов
-        paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")]
-        text = "\n".join(paragraphs)
+        return _article_text(html)
+    except Exception as e:
+        return ""
+
+
+# --- Асинхронный API (httpx) ---
+# Те же шаги, что и выше, но все сетевые запросы идут конкурентно в одном event loop.
+# Синхронные функции остаются основным API (и работают через HTTP-кэш SESSION).
+
+def _new_async_client() -> "httpx.AsyncClient":
+    """AsyncClient с ограниченным пулом соединений для асинхронного API модуля."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS),
+        timeout=10,
+    )
+
+
+@contextlib.asynccontextmanager
+async def _client_scope(client):
+    """Использует переданный клиент или создаёт (и закрывает) свой."""
+    if client is not None:
+        yield client
+        return
+    async with _new_async_client() as own_client:
+        yield own_client
+
+
+async def _afollow_redirects(client, url: str, max_hops: int = MAX_REDIRECT_HOPS) -> str | None:
+    """Асинхронный вариант _follow_redirects."""
+    for _ in range(max_hops):
+        try:
+            response = await client.head(url, headers=_BROWSER_HEADERS, timeout=3, follow_redirects=False)
+        except Exception:
+            return None
         
-        # Ограничиваем длину
-        if text and len(text) > 100:
-            return text[:10000]
+        location = response.headers.get("Location")
+        if not location:
+            return None
         
+        url = urllib.parse.urljoin(url, location)
+        if not _is_bad_url(url):
+            return url
+    
+    return None
+
+
+async def _aread_feed_stream(chunks, limit: int) -> list[dict]:
+    """Асинхронный вариант _read_feed_stream."""
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if len(head) >= FEED_SNIFF_BYTES:
+            break
+    
+    if b"<feed" in head[:FEED_SNIFF_BYTES]:
+        if not HAS_FEEDPARSER:
+            return []
+        rest = b"".join([chunk async for chunk in chunks])
+        return _parse_feedparser_items(head + rest, limit)
+    
+    seen = [head]
+    parser = ET.XMLPullParser(events=("end",))
+    items = []
+    try:
+        parser.feed(head)
+        if not _drain_rss_items(parser, items, limit):
+            async for chunk in chunks:
+                seen.append(chunk)
+                parser.feed(chunk)
+                if _drain_rss_items(parser, items, limit):
+                    break
+    except ET.ParseError:
+        items = []
+    if items or not HAS_FEEDPARSER:
+        return items
+    
+    rest = b"".join([chunk async for chunk in chunks])
+    return _parse_feedparser_items(b"".join(seen) + rest, limit)
+
+
+async def _afetch_feed_items(client, rss_url: str, limit: int) -> list[dict]:
+    """Асинхронный вариант _fetch_feed_items."""
+    headers = _feed_request_headers(rss_url, limit)
+    # Как и SESSION.get в синхронном варианте, идём по редиректам ленты (переданный клиент может их не включать)
+    async with client.stream("GET", rss_url, headers=headers, follow_redirects=True) as resp:
+        meta = _FEED_META.get(rss_url)
+        if resp.status_code == 304 and meta:
+            return meta[3][:limit]
+        resp.raise_for_status()
+        items = await _aread_feed_stream(resp.aiter_bytes(16384), limit)
+        _remember_feed(rss_url, resp.headers, limit, items)
+        return items
+
+
+async def afetch_rss_entries(rss_url: str, limit: int = 5, client=None) -> list[Article]:
+    """
+    Асинхронный вариант fetch_rss_entries: редиректы всех записей резолвятся одновременно.
+    Без httpx выполняет синхронную версию в потоке.
+    """
+    if not HAS_HTTPX:
+        return await asyncio.to_thread(fetch_rss_entries, rss_url, limit)
+    
+    try:
+        async with _client_scope(client) as c:
+            items = await _afetch_feed_items(c, rss_url, limit)
+            articles, pending = _build_articles(items)
+            if pending:
+                links = list(dict.fromkeys(link for _, link in pending))
+                results = await asyncio.gather(*(_afollow_redirects(c, link) for link in links))
+                _apply_redirects(articles, pending, dict(zip(links, results)))
+            return articles
+    except Exception as e:
+        return []
+
+
+async def afetch_many_rss(urls: list[str], limit: int = 5) -> list[list[Article]]:
+    """Асинхронный вариант fetch_many_rss: все ленты и их редиректы через один AsyncClient."""
+    if not urls:
+        return []
+    if not HAS_HTTPX:
+        return await asyncio.to_thread(fetch_many_rss, urls, limit)
+    
+    async with _new_async_client() as client:
+        return list(await asyncio.gather(*(afetch_rss_entries(url, limit, client) for url in urls)))
+
+
+async def afetch_article_body(url: str, client=None) -> str:
+    """Асинхронный вариант fetch_article_body (тот же дисковый кэш)."""
+    text = _body_cache_get(url)
+    if text is None:
+        text = await _afetch_article_body(url, client)
+        _body_cache_set(url, text)
+    return text
+
+
+async def _afetch_article_body(url: str, client=None) -> str:
+    if not HAS_SELECTOLAX and not HAS_BEAUTIFULSOUP:
         return ""
+    if not HAS_HTTPX:
+        return await asyncio.to_thread(_fetch_article_body, url)
+    
+    try:
+        async with _client_scope(client) as c:
+            async with c.stream("GET", url, headers={"User-Agent": "Mozilla/5.0"}, follow_redirects=True) as resp:
+                resp.raise_for_status()
+                chunks = []
+                total = 0
+                async for chunk in resp.aiter_bytes(8192):
+                    chunks.append(chunk)
+                    total += len(chunk)
+                    if total >= MAX_ARTICLE_BYTES:
+                        break
+                html = b"".join(chunks).decode(resp.encoding or "utf-8", "replace")
+    except Exception as e:
+        return ""
+    
+    try:
+        return _article_text(html)
     except Exception as e:
         return ""
-
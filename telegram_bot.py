@@ -3,23 +3,64 @@
 Telegram-бот «SMM-эксперт для travel-блога».
 Генерация постов (текст + DALL·E), публикация в Telegram и опционально VK,
 расписание (APScheduler), базовая аналитика (лог публикаций + replies_count).
+
+Производительность: горячий путь упирается в сетевой ввод-вывод (OpenAI, DALL·E, Bot API, VK),
+вычислений почти нет; второе по весу — запись лога публикаций. Поэтому оптимизации здесь —
+переиспользование соединений (общий httpx.AsyncClient), асинхронность (публикация и расписание
+в цикле событий бота), кэш детерминированных результатов (generate_post, превью) и лог в SQLite
+(post_log.db, режим WAL): пост — одна вставка, ответы сбрасываются пачкой, а /stats и /analytics
+берут последние посты и агрегаты из памяти, не читая базу.
 """
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import copy
+import functools
 import json
 import logging
+import operator
 import os
+import random
 import re
-from datetime import datetime, timedelta
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import Counter, deque
+from datetime import date, datetime, timedelta
+from itertools import islice
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
 
+import httpx
 from dotenv import load_dotenv
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters
+
+# orjson (C) сериализует лог и настройки в разы быстрее stdlib json; json остаётся запасным вариантом
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# uvloop — более быстрый цикл событий для asyncio (на Windows не поддерживается)
+try:
+    import uvloop
+    HAS_UVLOOP = sys.platform != "win32"
+except ImportError:
+    HAS_UVLOOP = False
 
 project_root = Path(__file__).parent
 env_path = project_root / ".env"
 load_dotenv(env_path)
 
+# Модули проекта импортируем после load_dotenv: они могут читать переменные окружения при импорте
+from generations.image_gen import ImageGenerator
+from generations.text_gen import RUBRIC_LABELS, PostGenerator, Rubric
+from social_publishers.telegram_publisher import TelegramPublisher
+
 # Конфиг
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN") or os.getenv("telegram_bot_token")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
@@ -30,7 +71,19 @@ VK_GROUP_ID = os.getenv("VK_GROUP_ID") or os.getenv("group_id")
 
 DATA_DIR = project_root / "data"
 SETTINGS_PATH = DATA_DIR / "bot_settings.json"
-POST_LOG_PATH = DATA_DIR / "post_log.json"
+# Лог публикаций — SQLite (таблица posts); прежний post_log.json переносится в базу при первом открытии
+POST_DB_PATH = DATA_DIR / "post_log.db"
+# Версия схемы в PRAGMA user_version; 1 — старый лог перенесён
+POST_DB_VERSION = 1
+# post_log.json — JSON-массив в прежнем формате: его читает веб-страница «Аналитика Telegram» (app/smm.py).
+# Бот выгружает в него базу не чаще раза в POST_LOG_EXPORT_INTERVAL секунд, если лог изменился
+POST_LOG_JSON_PATH = DATA_DIR / "post_log.json"
+POST_LOG_EXPORT_INTERVAL = 30
+# Сколько последних постов держать в памяти: ровно столько показывают /stats и /analytics
+RECENT_POSTS_MAX = 10
+# Как часто (сек) сбрасывать накопленные ответы в базу и при скольких постах с ответами в очереди — не дожидаясь таймера
+REPLIES_FLUSH_INTERVAL = 2
+REPLIES_FLUSH_MAX_PENDING = 500
 
 DEFAULT_SETTINGS = {
     "target_chat_id": None,
@@ -64,13 +117,51 @@ WEEKDAY_RUBRIC = [
     "CHECKLIST",   # Вс (чередуем с SEASON)
 ]
 
+# Кнопки под превью поста (/generate, перегенерация картинки)
+_PREVIEW_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Опубликовать сейчас", callback_data="PUBLISH_NOW")],
+    [
+        InlineKeyboardButton("Перегенерировать текст", callback_data="REGEN_TEXT"),
+        InlineKeyboardButton("Перегенерировать картинку", callback_data="REGEN_IMAGE"),
+    ],
+])
+
+# Частота расписания: mon,wed,fri -> 0,2,4 (пн,ср,пт)
+_DAY_MAP = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+_FREQ_SPLIT_RE = re.compile(r"[\s,]+")
+_TIME_RE = re.compile(r"^\d{1,2}[:.]\d{2}$")
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     level=logging.INFO,
 )
 logger = logging.getLogger("travel_bot")
 
-# Превью по chat_id: {chat_id: {"post_text", "image_url", "meta", "image_prompt", "destination", "rubric"}}
+# Асинхронный клиент для публикации из корутин; создаётся лениво в цикле событий бота
+_ahttp: httpx.AsyncClient | None = None
+# Размер куска при потоковом скачивании картинки
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# Сколько обновлений бот обрабатывает одновременно
+CONCURRENT_UPDATES = 32
+# Long polling: getUpdates висит до POLL_TIMEOUT секунд и сразу возвращает новые обновления
+POLL_TIMEOUT = 25
+# Пул соединений к Bot API для обработчиков (getUpdates ходит через отдельное соединение)
+BOT_API_POOL_SIZE = 256
+BOT_API_POOL_TIMEOUT = 5
+# Только те типы обновлений, которые бот обрабатывает: команды и ответы (message) и кнопки превью
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+# Сколько генераций (OpenAI: текст и картинки) идёт одновременно; остальные ждут своей очереди
+GEN_CONCURRENCY = 8
+# Создаётся в _on_startup, уже в цикле событий бота: на Python 3.9 семафор привязывается к циклу при создании
+GEN_SEM: asyncio.Semaphore | None = None
+# id бота: запоминается в post_init, чтобы handle_reply не обращался к context.bot на каждый ответ
+BOT_ID: int | None = None
+# Замки по chat_id для обработчиков, работающих с превью чата; удаляются, когда ими никто не пользуется
+_chat_locks: dict[int, asyncio.Lock] = {}
+_chat_lock_users: Counter[int] = Counter()
+
+# Превью по chat_id: {chat_id: {"post_text", "image_url", "image_file", "meta", "image_prompt", "destination", "rubric", "tone"}}
 preview_cache: dict[int, dict[str, Any]] = {}
 
 
@@ -78,55 +169,296 @@ def ensure_data_dir() -> None:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 
+def _json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """JSON в UTF-8, без экранирования кириллицы."""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def _json_loads(data: bytes | str) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Кэш настроек в памяти процесса: файл меняется только через save_settings (или извне — это видно по mtime)
+_settings_lock = threading.RLock()
+_settings_cache: dict[str, Any] | None = None
+_settings_mtime: int = -1
+
+
 def load_settings() -> dict[str, Any]:
+    global _settings_cache, _settings_mtime
     ensure_data_dir()
-    if not SETTINGS_PATH.exists():
-        return dict(DEFAULT_SETTINGS)
-    try:
-        with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        for k, v in DEFAULT_SETTINGS.items():
-            if k not in data:
-                data[k] = v
-        return data
-    except Exception as e:
-        logger.warning("load_settings: %s", e)
-        return dict(DEFAULT_SETTINGS)
+    with _settings_lock:
+        try:
+            mtime = SETTINGS_PATH.stat().st_mtime_ns
+        except FileNotFoundError:
+            return copy.deepcopy(DEFAULT_SETTINGS)
+        if _settings_cache is not None and mtime == _settings_mtime:
+            return copy.deepcopy(_settings_cache)
+        try:
+            with open(SETTINGS_PATH, "rb") as f:
+                data = _json_loads(f.read())
+            for k, v in DEFAULT_SETTINGS.items():
+                if k not in data:
+                    data[k] = copy.deepcopy(v)
+            _settings_cache, _settings_mtime = data, mtime
+            return copy.deepcopy(data)
+        except Exception as e:
+            logger.warning("load_settings: %s", e)
+            return copy.deepcopy(DEFAULT_SETTINGS)
 
 
 def save_settings(settings: dict[str, Any]) -> None:
+    global _settings_cache, _settings_mtime
     ensure_data_dir()
+    with _settings_lock:
+        try:
+            with open(SETTINGS_PATH, "wb") as f:
+                f.write(_json_dumps(settings, indent=True))
+            _settings_cache = copy.deepcopy(settings)
+            _settings_mtime = SETTINGS_PATH.stat().st_mtime_ns
+        except Exception as e:
+            logger.error("save_settings: %s", e)
+
+
+# Соединение с базой лога; доступ из обработчиков и задач бота — под замком
+_log_lock = threading.RLock()
+_db: sqlite3.Connection | None = None
+# Индекс постов бота: {(chat_id, tg_message_id): id строки в posts}; None — ещё не загружен
+_msg_index: dict[tuple[int, int], int] | None = None
+# Чаты, куда бот хоть раз публиковал: ответы из остальных чатов отбрасываются без захвата _log_lock
+BOT_CHATS: set[int] = set()
+# Последние посты (с актуальным replies_count); None — ещё не загружены
+_recent_posts: deque[dict[str, Any]] | None = None
+# Накопительные агрегаты для /analytics: total_posts, total_replies, by_rubric; None — ещё не посчитаны
+_stats: dict[str, Any] | None = None
+# Ответы, ещё не записанные в базу: {id строки: сколько добавить}; сбрасываются flush_replies
+_pending_replies: Counter[int] = Counter()
+# True, когда flush_replies вызывается периодически (job_queue бота); иначе ответы пишутся сразу
+_replies_flush_scheduled = False
+# Лог изменился после последней выгрузки в post_log.json
+_export_dirty = False
+# Старый post_log.json перенесён в базу (PRAGMA user_version); до этого выгрузка в него запрещена
+_log_migrated = False
+# True, когда export_post_log вызывается периодически; иначе выгрузка идёт сразу после изменения
+_export_scheduled = False
+
+_POST_COLUMNS = ("datetime_iso", "chat_id", "tg_message_id", "rubric", "destination", "tone", "vk_post_id", "replies_count")
+_SELECT_POSTS = f"SELECT id, {', '.join(_POST_COLUMNS)} FROM posts"
+# Поля строки /stats и /analytics: записи в _recent_posts всегда содержат все колонки
+_STATS_FIELDS = operator.itemgetter("dt_display", "rubric", "destination", "replies_count", "vk_post_id")
+_ANALYTICS_FIELDS = operator.itemgetter("dt_display", "rubric", "destination", "replies_count")
+_DT_DISPLAY_TRANS = str.maketrans({"T": " "})
+_INSERT_POST = f"INSERT INTO posts ({', '.join(_POST_COLUMNS)}) VALUES ({', '.join('?' * len(_POST_COLUMNS))})"
+
+
+def _read_legacy_post_log() -> list[dict[str, Any]]:
+    """Записи прежнего лога post_log.json (JSON-массив)."""
+    if POST_LOG_JSON_PATH.exists():
+        with open(POST_LOG_JSON_PATH, "rb") as f:
+            return _json_loads(f.read())
+    return []
+
+
+def _entry_row(entry: dict[str, Any]) -> tuple[Any, ...]:
+    return tuple(entry.get(c, 0 if c == "replies_count" else None) for c in _POST_COLUMNS)
+
+
+def _row_entry(row: tuple[Any, ...]) -> dict[str, Any]:
+    return dict(zip(("id",) + _POST_COLUMNS, row))
+
+
+def _with_display(entry: dict[str, Any]) -> dict[str, Any]:
+    """Добавляет к записи для /stats и /analytics готовую строку даты (один раз, а не при каждом показе)."""
+    entry["dt_display"] = (entry.get("datetime_iso") or "")[:16].translate(_DT_DISPLAY_TRANS)
+    return entry
+
+
+def _get_db() -> sqlite3.Connection:
+    """
+    Открывает базу лога (один раз на процесс), создаёт схему и переносит старый лог.
+    Перенос отмечается в PRAGMA user_version в той же транзакции, что и вставка записей,
+    поэтому неудачный перенос повторится при следующем запуске. Посты, записанные после
+    неудачного переноса, при повторе остаются после перенесённых (старые записи идут первыми).
+    """
+    global _db, _export_dirty, _log_migrated
+    with _log_lock:
+        if _db is not None:
+            return _db
+        ensure_data_dir()
+        db = sqlite3.connect(POST_DB_PATH, check_same_thread=False)
+        # WAL: вставка поста или пачки ответов дописывает страницы в журнал, а не переписывает файл базы
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                datetime_iso TEXT,
+                chat_id INTEGER,
+                tg_message_id INTEGER,
+                rubric TEXT,
+                destination TEXT,
+                tone TEXT,
+                vk_post_id TEXT,
+                replies_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_posts_msg ON posts(chat_id, tg_message_id);
+            """
+        )
+        _log_migrated = db.execute("PRAGMA user_version").fetchone()[0] >= POST_DB_VERSION
+        if not _log_migrated:
+            try:
+                entries = _read_legacy_post_log()
+                with db:
+                    if entries:
+                        newer = db.execute(f"SELECT {', '.join(_POST_COLUMNS)} FROM posts ORDER BY id").fetchall()
+                        db.execute("DELETE FROM posts")
+                        db.executemany(_INSERT_POST, [_entry_row(e) for e in entries])
+                        db.executemany(_INSERT_POST, newer)
+                    db.execute(f"PRAGMA user_version = {POST_DB_VERSION}")
+                _log_migrated = True
+                if entries:
+                    logger.info("post_log: migrated %d entries to %s", len(entries), POST_DB_PATH.name)
+                    _export_dirty = True
+            except Exception as e:
+                # post_log.json не перезаписывается выгрузкой, пока перенос не удался (см. export_post_log)
+                logger.warning("post_log migration from %s failed, will retry on next start: %s", POST_LOG_JSON_PATH.name, e)
+        _db = db
+        return _db
+
+
+def flush_replies() -> None:
+    """Одной транзакцией дописывает в базу накопленные ответы."""
+    with _log_lock:
+        if not _pending_replies:
+            return
+        pending = dict(_pending_replies)
+        _pending_replies.clear()
+        try:
+            db = _get_db()
+            with db:
+                db.executemany(
+                    "UPDATE posts SET replies_count = replies_count + ? WHERE id = ?",
+                    [(n, row_id) for row_id, n in pending.items()],
+                )
+        except Exception as e:
+            # Не теряем ответы: вернём их в очередь до следующего сброса
+            _pending_replies.update(pending)
+            logger.error("flush_replies: %s", e)
+            return
+        _mark_log_changed()
+
+
+def _mark_log_changed() -> None:
+    global _export_dirty
+    with _log_lock:
+        _export_dirty = True
+        if not _export_scheduled:
+            export_post_log()
+
+
+def export_post_log() -> None:
+    """Выгружает лог в post_log.json (формат до перехода на SQLite) для веб-приложения, если он изменился."""
+    global _export_dirty
+    with _log_lock:
+        if not _export_dirty:
+            return
+        _get_db()
+        if not _log_migrated:
+            return  # post_log.json — ещё не перенесённая история: не затираем её выгрузкой
+        entries = [{c: e[c] for c in _POST_COLUMNS} for e in load_post_log()]
+        _export_dirty = False
+    tmp_path = POST_LOG_JSON_PATH.with_suffix(".json.tmp")
     try:
-        with open(SETTINGS_PATH, "w", encoding="utf-8") as f:
-            json.dump(settings, f, ensure_ascii=False, indent=2)
+        # Через временный файл: веб-приложение не должно прочитать недописанный JSON
+        with open(tmp_path, "wb") as f:
+            f.write(_json_dumps(entries, indent=True))
+        os.replace(tmp_path, POST_LOG_JSON_PATH)
     except Exception as e:
-        logger.error("save_settings: %s", e)
+        _export_dirty = True
+        logger.error("export_post_log: %s", e)
 
 
 def load_post_log() -> list[dict[str, Any]]:
-    ensure_data_dir()
-    if not POST_LOG_PATH.exists():
-        return []
+    """Весь лог публикаций в порядке добавления."""
     try:
-        with open(POST_LOG_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with _log_lock:
+            flush_replies()
+            return [_row_entry(row) for row in _get_db().execute(_SELECT_POSTS + " ORDER BY id")]
     except Exception as e:
         logger.warning("load_post_log: %s", e)
         return []
 
 
 def save_post_log(log_entries: list[dict[str, Any]]) -> None:
-    ensure_data_dir()
+    """Заменяет лог целиком."""
     try:
-        with open(POST_LOG_PATH, "w", encoding="utf-8") as f:
-            json.dump(log_entries, f, ensure_ascii=False, indent=2)
+        with _log_lock:
+            db = _get_db()
+            with db:
+                db.execute("DELETE FROM posts")
+                db.executemany(_INSERT_POST, [_entry_row(e) for e in log_entries])
+            _pending_replies.clear()
+            _load_log_state()
+            _mark_log_changed()
     except Exception as e:
         logger.error("save_post_log: %s", e)
 
 
+def _load_log_state() -> None:
+    """Прогревает состояние в памяти из базы: индекс постов, последние посты и агрегаты для /analytics."""
+    global _msg_index, _recent_posts, _stats, BOT_CHATS
+    db = _get_db()
+    _msg_index = {(chat_id, msg_id): row_id for chat_id, msg_id, row_id in db.execute("SELECT chat_id, tg_message_id, id FROM posts ORDER BY id")}
+    BOT_CHATS = {chat_id for chat_id, _ in _msg_index}
+    rows = db.execute(_SELECT_POSTS + " ORDER BY id DESC LIMIT ?", (RECENT_POSTS_MAX,)).fetchall()
+    _recent_posts = deque((_with_display(_row_entry(row)) for row in reversed(rows)), maxlen=RECENT_POSTS_MAX)
+    total_posts, total_replies = db.execute("SELECT COUNT(*), COALESCE(SUM(replies_count), 0) FROM posts").fetchone()
+    _stats = {
+        "total_posts": total_posts,
+        "total_replies": total_replies,
+        "by_rubric": Counter(dict(db.execute("SELECT COALESCE(rubric, ''), COUNT(*) FROM posts GROUP BY 1"))),
+    }
+
+
+def _ensure_log_state() -> None:
+    with _log_lock:
+        if _msg_index is None or _recent_posts is None or _stats is None:
+            _load_log_state()
+
+
+def is_logged_post(chat_id: int, tg_message_id: int) -> bool:
+    """Есть ли пост бота с таким message_id в логе (поиск в словаре, без запроса к базе)."""
+    with _log_lock:
+        _ensure_log_state()
+        return (chat_id, tg_message_id) in _msg_index
+
+
+def get_recent_posts(n: int) -> list[dict[str, Any]]:
+    """n последних публикаций, новые первыми."""
+    with _log_lock:
+        _ensure_log_state()
+        return [dict(e) for e in islice(reversed(_recent_posts), n)]
+
+
+def get_stats() -> dict[str, Any]:
+    """Копия накопительных агрегатов по логу (без запросов к базе после первого вызова)."""
+    with _log_lock:
+        _ensure_log_state()
+        return {
+            "total_posts": _stats["total_posts"],
+            "total_replies": _stats["total_replies"],
+            "by_rubric": Counter(_stats["by_rubric"]),
+        }
+
+
 def append_log(chat_id: int, tg_message_id: int, rubric: str, destination: str, tone: str, vk_post_id: str | None = None) -> None:
-    log = load_post_log()
-    log.append({
+    entry = {
         "datetime_iso": datetime.utcnow().replace(tzinfo=None).isoformat() + "Z",
         "chat_id": chat_id,
         "tg_message_id": tg_message_id,
@@ -135,28 +467,272 @@ def append_log(chat_id: int, tg_message_id: int, rubric: str, destination: str,
         "tone": tone,
         "vk_post_id": vk_post_id,
         "replies_count": 0,
-    })
-    save_post_log(log)
+    }
+    try:
+        with _log_lock:
+            _ensure_log_state()
+            db = _get_db()
+            with db:
+                entry["id"] = db.execute(_INSERT_POST, _entry_row(entry)).lastrowid
+            _msg_index[(chat_id, tg_message_id)] = entry["id"]
+            BOT_CHATS.add(chat_id)
+            _recent_posts.append(_with_display(entry))
+            _stats["total_posts"] += 1
+            _stats["by_rubric"][rubric or ""] += 1
+            _mark_log_changed()
+    except Exception as e:
+        logger.error("append_log: %s", e)
 
 
 def increment_replies_for_message(chat_id: int, tg_message_id: int) -> None:
-    log = load_post_log()
-    for entry in reversed(log):
-        if entry.get("chat_id") == chat_id and entry.get("tg_message_id") == tg_message_id:
-            entry["replies_count"] = entry.get("replies_count", 0) + 1
-            save_post_log(log)
-            return
-    # Не нашли — не падаем, просто не увеличиваем
-    logger.debug("replies: no log entry for chat_id=%s message_id=%s", chat_id, tg_message_id)
+    key = (chat_id, tg_message_id)
+    try:
+        with _log_lock:
+            _ensure_log_state()
+            row_id = _msg_index.get(key)
+            if row_id is None:
+                # Не нашли — не падаем, просто не увеличиваем
+                logger.debug("replies: no log entry for chat_id=%s message_id=%s", chat_id, tg_message_id)
+                return
+            # В базу — пачкой раз в REPLIES_FLUSH_INTERVAL секунд, а не транзакцией на каждый ответ
+            _pending_replies[row_id] += 1
+            if not _replies_flush_scheduled or len(_pending_replies) >= REPLIES_FLUSH_MAX_PENDING:
+                flush_replies()
+            _stats["total_replies"] += 1
+            # _recent_posts упорядочен по id: более старые посты в нём не ищем
+            if _recent_posts and row_id >= _recent_posts[0]["id"]:
+                for entry in reversed(_recent_posts):
+                    if entry["id"] == row_id:
+                        entry["replies_count"] += 1
+                        break
+    except Exception as e:
+        logger.error("increment_replies: %s", e)
 
 
-def run_generate_and_publish(chat_id: int, settings: dict[str, Any], destination_override: str | None = None) -> dict[str, Any]:
-    """Генерирует пост + картинку и публикует в target_chat_id и опционально VK. Возвращает результат с tg_message_id и т.д."""
-    from generations.text_gen import PostGenerator, Rubric, RUBRIC_LABELS
-    from generations.image_gen import ImageGenerator
-    from social_publishers.telegram_publisher import TelegramPublisher
-    import requests
+def _get_ahttp() -> httpx.AsyncClient:
+    global _ahttp
+    if _ahttp is None or _ahttp.is_closed:
+        _ahttp = httpx.AsyncClient(
+            timeout=30,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+            transport=httpx.AsyncHTTPTransport(retries=3),
+        )
+    return _ahttp
+
+
+async def _run_generation(func: Any, *args: Any, **kwargs: Any) -> Any:
+    """Выполняет синхронный вызов генератора в пуле потоков, не больше GEN_CONCURRENCY одновременно."""
+    global GEN_SEM
+    if GEN_SEM is None:
+        GEN_SEM = asyncio.Semaphore(GEN_CONCURRENCY)
+    async with GEN_SEM:
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+async def _download_image(client: httpx.AsyncClient, image_url: str) -> IO[bytes] | None:
+    """Потоково скачивает картинку во временный файл, не собирая её целиком в памяти."""
+    f = tempfile.TemporaryFile()
+    try:
+        async with client.stream("GET", image_url) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.aiter_bytes(IMAGE_CHUNK_SIZE):
+                f.write(chunk)
+        return f
+    except asyncio.CancelledError:
+        f.close()
+        raise
+    except Exception as e:
+        # Любая ошибка скачивания (в т.ч. httpx.InvalidURL, StreamError) — не повод пропускать отправку текстом
+        f.close()
+        logger.warning("Image download failed: %s", e)
+        return None
+
+
+def _close_unused_download(task: asyncio.Task) -> None:
+    if task.cancelled() or task.exception() is not None:
+        return
+    if task.result() is not None:
+        task.result().close()
+
+
+async def _tg_send_photo(client: httpx.AsyncClient, target: Any, caption: str, photo: str | IO[bytes]) -> int | None:
+    """sendPhoto по URL или из файла картинки (отдаётся кусками). Возвращает message_id, при ошибке — исключение."""
+    data = {"chat_id": target, "caption": caption, "parse_mode": "HTML"}
+    if isinstance(photo, str):
+        resp = await client.post(
+            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto",
+            data={**data, "photo": photo},
+        )
+    else:
+        photo.seek(0)
+        resp = await client.post(
+            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto",
+            data=data,
+            files={"photo": ("image.jpg", photo, "image/jpeg")},
+        )
+    payload = _json_loads(resp.content)
+    if resp.is_success and payload.get("ok"):
+        return payload.get("result", {}).get("message_id")
+    raise Exception(payload.get("description", resp.text[:200]))
+
+
+async def _tg_publish(target: Any, post_text: str, image_url: str | None, preview: dict[str, Any] | None = None) -> int | None:
+    """
+    Публикует пост в Telegram: фото по URL, при неудаче — загрузкой файла, иначе только текст.
+    preview — запись preview_cache: скачанная картинка сохраняется в preview["image_file"] и переиспользуется.
+    """
+    client = _get_ahttp()
+    caption = post_text[:1024]
+    image_file = (preview or {}).get("image_file")
+    if image_file is None and image_url:
+        # Картинку качаем параллельно с sendPhoto по URL: если Telegram не заберёт её сам, файл уже на диске
+        download = asyncio.create_task(_download_image(client, image_url))
+        try:
+            return await _tg_send_photo(client, target, caption, image_url)
+        except Exception as e1:
+            logger.info("sendPhoto by URL failed, uploading the file: %s", e1)
+            image_file = await download
+            if image_file is not None and preview is not None:
+                preview["image_file"] = image_file
+        finally:
+            if image_file is None:
+                download.cancel()
+                download.add_done_callback(_close_unused_download)
+    if image_file is not None:
+        try:
+            return await _tg_send_photo(client, target, caption, image_file)
+        except Exception as e2:
+            logger.warning("Photo send failed, trying text only: %s", e2)
+        finally:
+            if preview is None:
+                image_file.close()
+    publisher = TelegramPublisher(TELEGRAM_BOT_TOKEN, str(target))
+    pub_resp = await asyncio.to_thread(publisher.publish_post, post_text, image_url=None)
+    return (pub_resp or {}).get("result", {}).get("message_id")
+
+
+async def _vk_publish(post_text: str, image_url: str | None) -> str | None:
+    try:
+        # Кросспост в VK опционален: без VK_API_KEY модуль и его зависимости не нужны
+        from social_publishers.vk_publisher import VKPublisher
+        vk = VKPublisher(VK_API_KEY, VK_GROUP_ID)
+        vk_resp = await asyncio.to_thread(vk.publish_post, post_text, image_url)
+        vk_post_id = (vk_resp.get("response") or {}).get("post_id")
+        return str(vk_post_id) if vk_post_id is not None else None
+    except Exception as e:
+        logger.warning("VK crosspost failed: %s", e)
+        return None
+
+
+async def _publish_post(
+    result: dict[str, Any],
+    target: Any,
+    settings: dict[str, Any],
+    post_text: str,
+    image_url: str | None,
+    rubric: str,
+    dest: str,
+    tone: str,
+    preview: dict[str, Any] | None = None,
+) -> None:
+    """Публикует готовый пост в Telegram (и VK), пишет лог и last_used. Заполняет result."""
+    # Telegram и VK независимы — публикуем одновременно
+    if settings.get("crosspost_vk") and VK_API_KEY and VK_GROUP_ID:
+        tg_res, vk_res = await asyncio.gather(
+            _tg_publish(target, post_text, image_url, preview),
+            _vk_publish(post_text, image_url),
+            return_exceptions=True,
+        )
+        if isinstance(vk_res, BaseException):
+            raise vk_res  # _vk_publish сам ловит Exception — сюда попадает только отмена
+        result["vk_post_id"] = vk_res
+        if isinstance(tg_res, BaseException):
+            if vk_res:
+                # Пост уже ушёл в VK: записываем его в лог, чтобы повтор не выглядел первой публикацией
+                append_log(int(target), 0, rubric, dest, tone, vk_post_id=vk_res)
+                raise Exception(f"{tg_res} (в VK пост опубликован: {vk_res})") from tg_res
+            raise tg_res
+        result["tg_message_id"] = tg_res
+    else:
+        result["tg_message_id"] = await _tg_publish(target, post_text, image_url, preview)
+
+    # Пишем в лог после кросспоста, чтобы vk_post_id попал в ту же запись без перезаписи файла
+    append_log(
+        int(target),
+        result["tg_message_id"] or 0,
+        rubric,
+        dest,
+        tone,
+        vk_post_id=result["vk_post_id"],
+    )
+
+    forget_generated_post(post_text)
+    # settings загружены до генерации: за это время /set_* могли изменить файл, поэтому перечитываем
+    # и обновляем только last_used (между load и save нет await — изменения не перетираются)
+    current = load_settings()
+    current["last_used"] = {"rubric": rubric, "destination": dest, "date": datetime.now().strftime("%Y-%m-%d")}
+    save_settings(current)
+    result["ok"] = True
+
+
+# Кэш сгенерированных текстов: {(дата, параметры генерации): ответ PostGenerator}; вытесняются самые старые
+GENERATE_CACHE_MAX = 256
+_generate_cache: dict[tuple[Any, ...], dict[str, Any]] = {}
+_generate_cache_lock = threading.Lock()
+
+
+def generate_post(
+    rubric: str,
+    destination: str,
+    season: str | None,
+    tone: str,
+    audience: str | None,
+    constraints: list[str] | None,
+) -> dict[str, Any]:
+    """
+    Текст поста через PostGenerator с кэшем в памяти процесса.
+    Ключ — параметры генерации и текущая дата: в пределах дня одинаковый запрос не идёт в OpenAI повторно,
+    а на следующий день пост генерируется заново. Опубликованный текст из кэша удаляется
+    (forget_generated_post), чтобы тот же пост не ушёл в канал дважды. Для нового варианта текста — PostGenerator напрямую (REGEN_TEXT).
+    """
+    key = (
+        date.today().isoformat(),
+        rubric,
+        destination,
+        season,
+        tone,
+        audience,
+        tuple(constraints) if isinstance(constraints, list) else (),
+    )
+    with _generate_cache_lock:
+        out = _generate_cache.get(key)
+    if out is None:
+        gen = PostGenerator(OPENAI_API_KEY, tone=tone, topic=destination)
+        out = gen.generate_travel_post(
+            rubric=rubric,
+            destination=destination,
+            season=season,
+            tone=tone,
+            audience=audience,
+            constraints=list(key[-1]),
+        )
+        with _generate_cache_lock:
+            if key not in _generate_cache and len(_generate_cache) >= GENERATE_CACHE_MAX:
+                del _generate_cache[next(iter(_generate_cache))]
+            _generate_cache[key] = out
+    return copy.deepcopy(out)
+
 
+def forget_generated_post(post_text: str) -> None:
+    """Убирает из кэша генерации запись с опубликованным текстом: следующий запрос даст новый пост."""
+    with _generate_cache_lock:
+        for key in [k for k, out in _generate_cache.items() if (out.get("post_text") or "")[:4000] == post_text]:
+            del _generate_cache[key]
+
+
+async def run_generate_and_publish(chat_id: int, settings: dict[str, Any], destination_override: str | None = None) -> dict[str, Any]:
+    """Генерирует пост + картинку и публикует в target_chat_id и опционально VK. Возвращает результат с tg_message_id и т.д."""
     target = settings.get("target_chat_id")
     if not target:
         return {"ok": False, "error": "Не задан целевой чат. Вызови /set_target в группе/канале."}
@@ -174,95 +750,46 @@ def run_generate_and_publish(chat_id: int, settings: dict[str, Any], destination
     result: dict[str, Any] = {"ok": False, "tg_message_id": None, "vk_post_id": None, "error": None}
 
     try:
-        gen = PostGenerator(OPENAI_API_KEY, tone=tone, topic=dest)
-        out = gen.generate_travel_post(
-            rubric=rubric,
-            destination=dest,
-            season=season,
-            tone=tone,
-            audience=audience,
-            constraints=constraints if isinstance(constraints, list) else [],
-        )
+        # Генераторы синхронные (OpenAI SDK) — выполняем в пуле потоков, чтобы не блокировать цикл событий бота
+        out = await _run_generation(generate_post, rubric, dest, season, tone, audience, constraints)
         post_text = (out.get("post_text") or "")[:4000]
         image_prompt = out.get("image_prompt") or ""
 
         image_url = None
         try:
             img_gen = ImageGenerator(OPENAI_API_KEY)
-            urls = img_gen.generate_images(image_prompt, n=1, style="photo", travel=True)
+            urls = await _run_generation(img_gen.generate_images, image_prompt, n=1, style="photo", travel=True)
             if urls:
                 image_url = urls[0]
         except Exception as e:
             logger.warning("Image generation failed: %s", e)
 
-        publisher = TelegramPublisher(TELEGRAM_BOT_TOKEN, str(target))
-        if image_url:
-            try:
-                resp = requests.post(
-                    f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto",
-                    data={
-                        "chat_id": target,
-                        "photo": image_url,
-                        "caption": post_text[:1024],
-                        "parse_mode": "HTML",
-                    },
-                    timeout=30,
-                )
-                if resp.ok and resp.json().get("ok"):
-                    result["tg_message_id"] = resp.json().get("result", {}).get("message_id")
-                else:
-                    raise Exception(resp.json().get("description", resp.text[:200]))
-            except Exception as e1:
-                try:
-                    img_data = requests.get(image_url, timeout=30).content
-                    resp = requests.post(
-                        f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto",
-                        data={"chat_id": target, "caption": post_text[:1024], "parse_mode": "HTML"},
-                        files={"photo": ("image.jpg", img_data, "image/jpeg")},
-                        timeout=30,
-                    )
-                    if resp.ok and resp.json().get("ok"):
-                        result["tg_message_id"] = resp.json().get("result", {}).get("message_id")
-                    else:
-                        raise Exception(resp.json().get("description", "sendPhoto failed"))
-                except Exception as e2:
-                    logger.warning("Photo send failed, trying text only: %s", e2)
-                    pub_resp = publisher.publish_post(post_text, image_url=None)
-                    result["tg_message_id"] = (pub_resp or {}).get("result", {}).get("message_id")
-        else:
-            pub_resp = publisher.publish_post(post_text, image_url=None)
-            result["tg_message_id"] = (pub_resp or {}).get("result", {}).get("message_id")
-
-        append_log(
-            int(target),
-            result["tg_message_id"] or 0,
-            rubric,
-            dest,
-            tone,
-            vk_post_id=None,
-        )
+        await _publish_post(result, target, settings, post_text, image_url, rubric, dest, tone)
+        return result
+    except Exception as e:
+        logger.exception("run_generate_and_publish")
+        result["error"] = str(e)
+        return result
 
-        if settings.get("crosspost_vk") and VK_API_KEY and VK_GROUP_ID:
-            try:
-                from social_publishers.vk_publisher import VKPublisher
-                vk = VKPublisher(VK_API_KEY, VK_GROUP_ID)
-                vk_resp = vk.publish_post(post_text, image_url)
-                vk_post_id = (vk_resp.get("response") or {}).get("post_id")
-                if vk_post_id is not None:
-                    result["vk_post_id"] = str(vk_post_id)
-                    log = load_post_log()
-                    if log:
-                        log[-1]["vk_post_id"] = result["vk_post_id"]
-                        save_post_log(log)
-            except Exception as e:
-                logger.warning("VK crosspost failed: %s", e)
 
-        settings["last_used"] = {"rubric": rubric, "destination": dest, "date": datetime.now().strftime("%Y-%m-%d")}
-        save_settings(settings)
-        result["ok"] = True
+async def publish_from_preview(chat_id: int, cached: dict[str, Any], settings: dict[str, Any]) -> dict[str, Any]:
+    """Публикует готовое превью из preview_cache в chat_id — без повторной генерации текста и картинки."""
+    result: dict[str, Any] = {"ok": False, "tg_message_id": None, "vk_post_id": None, "error": None}
+    try:
+        await _publish_post(
+            result,
+            chat_id,
+            settings,
+            cached.get("post_text") or "",
+            cached.get("image_url"),
+            cached.get("rubric") or "TIPS",
+            cached.get("destination") or "Стамбул",
+            cached.get("tone") or "FRIENDLY",
+            preview=cached,
+        )
         return result
     except Exception as e:
-        logger.exception("run_generate_and_publish")
+        logger.exception("publish_from_preview")
         result["error"] = str(e)
         return result
 
@@ -288,9 +815,8 @@ def get_rubric_for_weekday(weekday: int, last_used: dict | None, content_plan: d
     return r
 
 
-def scheduled_job_standalone() -> None:
+async def scheduled_job_standalone() -> None:
     """Вызов по расписанию (APScheduler): загружаем настройки и публикуем."""
-    import random
     settings = load_settings()
     chat_id = settings.get("target_chat_id")
     if not chat_id and TELEGRAM_CHAT_ID:
@@ -308,8 +834,7 @@ def scheduled_job_standalone() -> None:
         settings["destination"] = dest
         logger.info("scheduled_job: random destination=%s", dest)
     try:
-        from datetime import datetime as dt
-        wd = dt.now().weekday()
+        wd = datetime.now().weekday()
         last = settings.get("last_used") or {}
         content_plan = settings.get("content_plan") or {}
         rubric = get_rubric_for_weekday(wd, last, content_plan)
@@ -322,12 +847,11 @@ def scheduled_job_standalone() -> None:
         logger.warning("scheduled_job settings: %s", e)
 
     logger.info("scheduled_job: generating and publishing to chat_id=%s destination=%s", chat_id, settings.get("destination"))
-    result = run_generate_and_publish(int(chat_id), settings, destination_override=None)
+    result = await run_generate_and_publish(int(chat_id), settings, destination_override=None)
     if not result.get("ok"):
         logger.error("scheduled_job failed: %s", result.get("error"))
         try:
-            import requests
-            requests.post(
+            await _get_ahttp().post(
                 f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
                 data={"chat_id": chat_id, "text": f"Ошибка по расписанию: {result.get('error', 'unknown')}"},
                 timeout=10,
@@ -340,10 +864,14 @@ _scheduler: Any = None
 
 
 def setup_scheduler() -> None:
-    """Настраивает APScheduler (время/дни из bot_settings). Вызывать при старте и при /set_schedule, /set_frequency, /set_target."""
+    """
+    Настраивает APScheduler (время/дни из bot_settings). Вызывать при старте и при /set_schedule, /set_frequency, /set_target.
+    Планировщик работает в цикле событий бота, поэтому вызывать только из него (post_init или обработчики).
+    """
     global _scheduler
     try:
-        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.jobstores.base import JobLookupError
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
         from apscheduler.triggers.cron import CronTrigger
         import pytz
     except ImportError as e:
@@ -362,7 +890,7 @@ def setup_scheduler() -> None:
         if _scheduler is not None:
             try:
                 _scheduler.remove_job("travel_post_job")
-            except Exception:
+            except JobLookupError:
                 pass
         logger.info("Scheduler: disabled or no target_chat_id")
         return
@@ -378,28 +906,49 @@ def setup_scheduler() -> None:
     if freq == "daily":
         trigger = CronTrigger(hour=h, minute=m, timezone=tz)
     else:
-        # mon,wed,fri -> 0,2,4 (пн,ср,пт)
-        day_map = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
-        parts = re.split(r"[\s,]+", freq.lower())
+        parts = _FREQ_SPLIT_RE.split(freq)
         days = []
         for p in parts:
-            if p in day_map and day_map[p] not in days:
-                days.append(day_map[p])
+            if p in _DAY_MAP and _DAY_MAP[p] not in days:
+                days.append(_DAY_MAP[p])
         if not days:
             days = [0, 2, 4]
         trigger = CronTrigger(day_of_week=",".join(str(d) for d in sorted(days)), hour=h, minute=m, timezone=tz)
 
     if _scheduler is None:
-        _scheduler = BackgroundScheduler(timezone=tz)
+        _scheduler = AsyncIOScheduler(timezone=tz, event_loop=asyncio.get_running_loop())
         _scheduler.start()
-    try:
-        _scheduler.remove_job("travel_post_job")
-    except Exception:
-        pass
-    _scheduler.add_job(scheduled_job_standalone, trigger, id="travel_post_job")
+    # Повторный вызов (/set_schedule и т.п.) заменяет задачу на месте; пропущенные запуски не копятся
+    _scheduler.add_job(scheduled_job_standalone, trigger, id="travel_post_job", replace_existing=True, coalesce=True, max_instances=1)
     logger.info("Scheduler: job set at %s (%s)", time_str, freq)
 
 
+@contextlib.asynccontextmanager
+async def _chat_lock(chat_id: int) -> Any:
+    lock = _chat_locks.setdefault(chat_id, asyncio.Lock())
+    _chat_lock_users[chat_id] += 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _chat_lock_users[chat_id] -= 1
+        if not _chat_lock_users[chat_id]:
+            del _chat_lock_users[chat_id]
+            _chat_locks.pop(chat_id, None)
+
+
+def _serialized_per_chat(handler: Any) -> Any:
+    """Обновления одного чата обрабатываются по очереди, разных чатов — параллельно."""
+    @functools.wraps(handler)
+    async def wrapper(update: Any, context: Any) -> None:
+        chat = update.effective_chat
+        if chat is None:
+            return await handler(update, context)
+        async with _chat_lock(chat.id):
+            return await handler(update, context)
+    return wrapper
+
+
 async def cmd_start(update: Any, context: Any) -> None:
     settings = load_settings()
     target = settings.get("target_chat_id")
@@ -431,7 +980,6 @@ async def cmd_start(update: Any, context: Any) -> None:
 
 
 async def cmd_rubrics(update: Any, context: Any) -> None:
-    from generations.text_gen import RUBRIC_LABELS, Rubric
     lines = ["Рубрики (контент-пиллары):"]
     for r in Rubric:
         lines.append(f"• {r.value} — {RUBRIC_LABELS.get(r, r.value)}")
@@ -444,7 +992,6 @@ async def cmd_set_rubric(update: Any, context: Any) -> None:
         await update.message.reply_text("Использование: /set_rubric <CODE>, например /set_rubric TIPS")
         return
     code = args[0].strip().upper()
-    from generations.text_gen import Rubric
     try:
         Rubric(code)
     except ValueError:
@@ -516,7 +1063,7 @@ async def cmd_set_schedule(update: Any, context: Any) -> None:
         await update.message.reply_text("Использование: /set_schedule HH:MM, например /set_schedule 09:30")
         return
     time_str = args[0].strip()
-    if not re.match(r"^\d{1,2}[:.]\d{2}$", time_str):
+    if not _TIME_RE.match(time_str):
         await update.message.reply_text("Формат времени: HH:MM или H.MM")
         return
     settings = load_settings()
@@ -551,6 +1098,7 @@ async def cmd_set_frequency(update: Any, context: Any) -> None:
         logger.warning("Reschedule after set_frequency: %s", e)
 
 
+@_serialized_per_chat
 async def cmd_generate(update: Any, context: Any) -> None:
     settings = load_settings()
     dest_override = " ".join(context.args or []).strip() or None
@@ -560,18 +1108,14 @@ async def cmd_generate(update: Any, context: Any) -> None:
         return
 
     try:
-        from generations.text_gen import PostGenerator
-        from generations.image_gen import ImageGenerator
-        import requests
-
-        gen = PostGenerator(OPENAI_API_KEY, tone=settings.get("tone") or "FRIENDLY", topic=dest)
-        out = gen.generate_travel_post(
-            rubric=settings.get("rubric") or "TIPS",
-            destination=dest,
-            season=settings.get("season"),
-            tone=settings.get("tone") or "FRIENDLY",
-            audience=settings.get("audience"),
-            constraints=settings.get("constraints") or [],
+        out = await _run_generation(
+            generate_post,
+            settings.get("rubric") or "TIPS",
+            dest,
+            settings.get("season"),
+            settings.get("tone") or "FRIENDLY",
+            settings.get("audience"),
+            settings.get("constraints") or [],
         )
         post_text = (out.get("post_text") or "")[:4000]
         image_prompt = out.get("image_prompt") or ""
@@ -580,13 +1124,17 @@ async def cmd_generate(update: Any, context: Any) -> None:
         image_url = None
         try:
             img_gen = ImageGenerator(OPENAI_API_KEY)
-            urls = img_gen.generate_images(image_prompt, n=1, style="photo", travel=True)
+            urls = await _run_generation(img_gen.generate_images, image_prompt, n=1, style="photo", travel=True)
             if urls:
                 image_url = urls[0]
         except Exception as e:
             logger.warning("Preview image gen: %s", e)
 
         chat_id = update.effective_chat.id
+        # Скачанная для прошлого превью картинка больше не нужна — закрываем временный файл
+        old_file = preview_cache.get(chat_id, {}).get("image_file")
+        if old_file is not None:
+            old_file.close()
         preview_cache[chat_id] = {
             "post_text": post_text,
             "image_url": image_url,
@@ -597,16 +1145,7 @@ async def cmd_generate(update: Any, context: Any) -> None:
             "tone": settings.get("tone") or "FRIENDLY",
         }
 
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-
-        kb = [
-            [InlineKeyboardButton("Опубликовать сейчас", callback_data="PUBLISH_NOW")],
-            [
-                InlineKeyboardButton("Перегенерировать текст", callback_data="REGEN_TEXT"),
-                InlineKeyboardButton("Перегенерировать картинку", callback_data="REGEN_IMAGE"),
-            ],
-        ]
-        reply_markup = InlineKeyboardMarkup(kb)
+        reply_markup = _PREVIEW_KB
 
         if image_url:
             try:
@@ -625,8 +1164,17 @@ async def cmd_generate(update: Any, context: Any) -> None:
 
 
 async def callback_buttons(update: Any, context: Any) -> None:
+    # Отвечаем на нажатие до замка чата: пока в чате идёт /generate, запрос кнопки успел бы устареть
+    try:
+        await update.callback_query.answer()
+    except Exception as e:
+        logger.warning("callback answer: %s", e)
+    await _handle_button(update, context)
+
+
+@_serialized_per_chat
+async def _handle_button(update: Any, context: Any) -> None:
     query = update.callback_query
-    await query.answer()
     data = query.data
     chat_id = query.message.chat.id
     cached = preview_cache.get(chat_id) if chat_id else None
@@ -636,11 +1184,12 @@ async def callback_buttons(update: Any, context: Any) -> None:
             await query.edit_message_caption(caption=(query.message.caption or "") + "\n\n[Превью устарело. Сделайте /generate заново.]")
             return
         settings = load_settings()
-        result = run_generate_and_publish(
-            int(settings.get("target_chat_id") or chat_id),
-            settings,
-            destination_override=cached.get("destination"),
-        )
+        target = settings.get("target_chat_id")
+        if not target:
+            await query.edit_message_caption(caption=(query.message.caption or "") + "\n\n❌ Не задан целевой чат. Вызови /set_target в группе/канале.")
+            return
+        # Публикуем то, что пользователь видит в превью, без повторных запросов к OpenAI
+        result = await publish_from_preview(int(target), cached, settings)
         if result.get("ok"):
             await query.edit_message_caption(caption=(query.message.caption or "") + "\n\n✅ Опубликовано.")
         else:
@@ -650,9 +1199,9 @@ async def callback_buttons(update: Any, context: Any) -> None:
     if data == "REGEN_TEXT" and cached:
         settings = load_settings()
         try:
-            from generations.text_gen import PostGenerator
             gen = PostGenerator(OPENAI_API_KEY, tone=cached.get("tone") or "FRIENDLY", topic=cached.get("destination") or "Стамбул")
-            out = gen.generate_travel_post(
+            out = await _run_generation(
+                gen.generate_travel_post,
                 rubric=cached.get("rubric") or "TIPS",
                 destination=cached.get("destination") or "Стамбул",
                 tone=cached.get("tone") or "FRIENDLY",
@@ -666,25 +1215,19 @@ async def callback_buttons(update: Any, context: Any) -> None:
 
     if data == "REGEN_IMAGE" and cached:
         try:
-            from generations.image_gen import ImageGenerator
             img_gen = ImageGenerator(OPENAI_API_KEY)
-            urls = img_gen.generate_images(cached.get("image_prompt") or "", n=1, style="photo", travel=True)
+            urls = await _run_generation(img_gen.generate_images, cached.get("image_prompt") or "", n=1, style="photo", travel=True)
             if urls:
                 cached["image_url"] = urls[0]
+                old_file = cached.pop("image_file", None)
+                if old_file is not None:
+                    old_file.close()
                 await query.message.delete()
-                from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-                kb = [
-                    [InlineKeyboardButton("Опубликовать сейчас", callback_data="PUBLISH_NOW")],
-                    [
-                        InlineKeyboardButton("Перегенерировать текст", callback_data="REGEN_TEXT"),
-                        InlineKeyboardButton("Перегенерировать картинку", callback_data="REGEN_IMAGE"),
-                    ],
-                ]
                 await context.bot.send_photo(
                     chat_id=chat_id,
                     photo=urls[0],
                     caption=cached["post_text"][:1024],
-                    reply_markup=InlineKeyboardMarkup(kb),
+                    reply_markup=_PREVIEW_KB,
                 )
             else:
                 await query.answer("Не удалось сгенерировать изображение", show_alert=True)
@@ -693,6 +1236,7 @@ async def callback_buttons(update: Any, context: Any) -> None:
         return
 
 
+@_serialized_per_chat
 async def cmd_post_now(update: Any, context: Any) -> None:
     settings = load_settings()
     dest_override = " ".join(context.args or []).strip() or None
@@ -701,7 +1245,7 @@ async def cmd_post_now(update: Any, context: Any) -> None:
         await update.message.reply_text("Сначала вызови /set_target в группе/канале, куда публиковать.")
         return
     await update.message.reply_text("Генерирую и публикую…")
-    result = run_generate_and_publish(int(target), settings, destination_override=dest_override)
+    result = await run_generate_and_publish(int(target), settings, destination_override=dest_override)
     if result.get("ok"):
         msg = "Опубликовано."
         if result.get("vk_post_id"):
@@ -712,109 +1256,162 @@ async def cmd_post_now(update: Any, context: Any) -> None:
 
 
 async def cmd_stats(update: Any, context: Any) -> None:
-    log = load_post_log()
-    last_10 = log[-10:] if len(log) >= 10 else log
-    last_10.reverse()
+    last_10 = get_recent_posts(RECENT_POSTS_MAX)
     if not last_10:
         await update.message.reply_text("Публикаций пока нет.")
         return
-    lines = ["Последние публикации:"]
-    for e in last_10:
-        dt = e.get("datetime_iso", "")[:19].replace("T", " ")
-        r = e.get("rubric", "")
-        dest = e.get("destination", "")
-        rep = e.get("replies_count", 0)
-        vk = e.get("vk_post_id", "")
-        lines.append(f"• {dt} | {r} | {dest} | replies: {rep}" + (f" | vk: {vk}" if vk else ""))
-    await update.message.reply_text("\n".join(lines))
+    body = "\n".join(
+        f"• {dt} | {r} | {dest} | replies: {rep}" + (f" | vk: {vk}" if vk else "")
+        for dt, r, dest, rep, vk in map(_STATS_FIELDS, last_10)
+    )
+    await update.message.reply_text(f"Последние публикации:\n{body}")
+
+
+# Неизменяемые части ответа /analytics собираются один раз при импорте
+_ANALYTICS_EMPTY = (
+    "Аналитика вовлечённости (Telegram)\n\n"
+    "Публикаций пока нет. Данные появятся после первых постов в группу."
+)
+_ANALYTICS_HEADER = "📊 Аналитика вовлечённости (Telegram)\n\n"
+_ANALYTICS_TABLE_HEADER = "\n\nПоследние 10 постов (дата | рубрика | направление | ответы):\n"
+_ANALYTICS_FOOTER = "\n\nПримечание: просмотры постов Telegram API для ботов не предоставляет."
 
 
 async def cmd_analytics(update: Any, context: Any) -> None:
     """Аналитика вовлечённости Telegram: сводка по ответам на посты бота."""
-    log = load_post_log()
-    if not log:
-        await update.message.reply_text(
-            "Аналитика вовлечённости (Telegram)\n\n"
-            "Публикаций пока нет. Данные появятся после первых постов в группу."
-        )
+    stats = get_stats()
+    if not stats["total_posts"]:
+        await update.message.reply_text(_ANALYTICS_EMPTY)
         return
-    total_posts = len(log)
-    total_replies = sum(e.get("replies_count", 0) for e in log)
+    total_posts = stats["total_posts"]
+    total_replies = stats["total_replies"]
     avg = total_replies / total_posts if total_posts else 0
-    lines = [
-        "📊 Аналитика вовлечённости (Telegram)",
-        "",
-        f"Всего публикаций: {total_posts}",
-        f"Всего ответов (replies) на посты: {total_replies}",
-        f"Среднее ответов на пост: {avg:.1f}",
-        "",
-        "Последние 10 постов (дата | рубрика | направление | ответы):",
-    ]
-    last_10 = log[-10:] if len(log) >= 10 else log
-    last_10.reverse()
-    for e in last_10:
-        dt = e.get("datetime_iso", "")[:16].replace("T", " ")
-        r = e.get("rubric", "")
-        dest = e.get("destination", "")
-        rep = e.get("replies_count", 0)
-        lines.append(f"• {dt} | {r} | {dest} | {rep} ответов")
-    lines.append("")
-    lines.append("Примечание: просмотры постов Telegram API для ботов не предоставляет.")
-    await update.message.reply_text("\n".join(lines))
+    by_rubric = ", ".join(f"{r or 'без рубрики'} — {n}" for r, n in stats["by_rubric"].most_common())
+    body = "\n".join(
+        f"• {dt} | {r} | {dest} | {rep} ответов"
+        for dt, r, dest, rep in map(_ANALYTICS_FIELDS, get_recent_posts(RECENT_POSTS_MAX))
+    )
+    await update.message.reply_text(
+        f"{_ANALYTICS_HEADER}"
+        f"Всего публикаций: {total_posts}\n"
+        f"Всего ответов (replies) на посты: {total_replies}\n"
+        f"Среднее ответов на пост: {avg:.1f}\n"
+        f"По рубрикам: {by_rubric}"
+        f"{_ANALYTICS_TABLE_HEADER}{body}{_ANALYTICS_FOOTER}"
+    )
 
 
 async def handle_reply(update: Any, context: Any) -> None:
     """Увеличиваем replies_count при ответе на любое сообщение в чате. Запись в логе ищется по chat_id и message_id (в каналах у постов from_user может быть None)."""
+    chat = update.effective_chat
+    if chat is None or chat.id not in BOT_CHATS:
+        return  # бот в этот чат не публиковал — ответ точно не на его пост
     if not update.message or not update.message.reply_to_message:
         return
     reply_to = update.message.reply_to_message
-    chat_id = update.effective_chat.id if update.effective_chat else None
-    if chat_id is None or reply_to.message_id is None:
+    chat_id = chat.id
+    if reply_to.message_id is None:
         return
+    if not is_logged_post(chat_id, reply_to.message_id):
+        return  # ответ не на пост бота — в базу не ходим
     # В канале сообщения бота приходят с from_user=None; проверяем только наличие ответа и ищем запись в логе
-    if reply_to.from_user and reply_to.from_user.is_bot and reply_to.from_user.id != context.bot.id:
+    bot_id = BOT_ID if BOT_ID is not None else context.bot.id
+    if reply_to.from_user and reply_to.from_user.is_bot and reply_to.from_user.id != bot_id:
         return  # ответ другому боту — не считаем
+    # Замок на пост не нужен: счётчик увеличивается синхронно под _log_lock, без await посередине,
+    # поэтому параллельные ответы на один пост не теряют инкременты
     increment_replies_for_message(chat_id, reply_to.message_id)
 
 
-def main() -> None:
-    if not TELEGRAM_BOT_TOKEN:
-        raise ValueError("TELEGRAM_BOT_TOKEN не задан в .env")
+async def _flush_replies_job(context: Any) -> None:
+    flush_replies()
 
-    from telegram import Update
-    from telegram.ext import (
-        Application,
-        CommandHandler,
-        CallbackQueryHandler,
-        MessageHandler,
-        filters,
-    )
 
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+async def _export_post_log_job(context: Any) -> None:
+    await asyncio.to_thread(export_post_log)
+
+
+async def _on_startup(application: Any) -> None:
+    global _replies_flush_scheduled, _export_scheduled, BOT_ID, GEN_SEM
+    BOT_ID = application.bot.id
+    GEN_SEM = asyncio.Semaphore(GEN_CONCURRENCY)
+    try:
+        # Заполняем BOT_CHATS до первых обновлений, иначе ответы на старые посты отбросятся
+        await asyncio.to_thread(_ensure_log_state)
+    except Exception as e:
+        logger.warning("post_log init: %s", e)
+    if application.job_queue is not None:
+        application.job_queue.run_repeating(_flush_replies_job, interval=REPLIES_FLUSH_INTERVAL)
+        _replies_flush_scheduled = True
+        application.job_queue.run_repeating(_export_post_log_job, interval=POST_LOG_EXPORT_INTERVAL)
+        _export_scheduled = True
+    else:
+        logger.warning("JobQueue is not available: replies and post_log.json are written immediately")
     try:
         setup_scheduler()
     except Exception as e:
         logger.warning("Scheduler init: %s", e)
 
-    application.add_handler(CommandHandler("start", cmd_start))
-    application.add_handler(CommandHandler("rubrics", cmd_rubrics))
-    application.add_handler(CommandHandler("set_rubric", cmd_set_rubric))
-    application.add_handler(CommandHandler("set_destination", cmd_set_destination))
-    application.add_handler(CommandHandler("set_tone", cmd_set_tone))
-    application.add_handler(CommandHandler("set_audience", cmd_set_audience))
-    application.add_handler(CommandHandler("set_constraints", cmd_set_constraints))
-    application.add_handler(CommandHandler("set_target", cmd_set_target))
-    application.add_handler(CommandHandler("set_schedule", cmd_set_schedule))
-    application.add_handler(CommandHandler("set_frequency", cmd_set_frequency))
-    application.add_handler(CommandHandler("generate", cmd_generate))
-    application.add_handler(CommandHandler("post_now", cmd_post_now))
-    application.add_handler(CommandHandler("stats", cmd_stats))
-    application.add_handler(CommandHandler("analytics", cmd_analytics))
-    application.add_handler(CallbackQueryHandler(callback_buttons))
-    application.add_handler(MessageHandler(filters.REPLY, handle_reply))
+
+async def _on_shutdown(application: Any) -> None:
+    flush_replies()
+    export_post_log()
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.shutdown(wait=False)
+    if _ahttp is not None:
+        await _ahttp.aclose()
+
+
+# Долгие обработчики (генерация, публикация) не должны задерживать обновления из других чатов
+HANDLERS = (
+    CommandHandler("start", cmd_start),
+    CommandHandler("rubrics", cmd_rubrics),
+    CommandHandler("set_rubric", cmd_set_rubric),
+    CommandHandler("set_destination", cmd_set_destination),
+    CommandHandler("set_tone", cmd_set_tone),
+    CommandHandler("set_audience", cmd_set_audience),
+    CommandHandler("set_constraints", cmd_set_constraints),
+    CommandHandler("set_target", cmd_set_target),
+    CommandHandler("set_schedule", cmd_set_schedule),
+    CommandHandler("set_frequency", cmd_set_frequency),
+    CommandHandler("generate", cmd_generate, block=False),
+    CommandHandler("post_now", cmd_post_now, block=False),
+    CommandHandler("stats", cmd_stats, block=False),
+    CommandHandler("analytics", cmd_analytics, block=False),
+    CallbackQueryHandler(callback_buttons, block=False),
+    MessageHandler(filters.REPLY, handle_reply, block=False),
+)
+
+
+def main() -> None:
+    if not TELEGRAM_BOT_TOKEN:
+        raise ValueError("TELEGRAM_BOT_TOKEN не задан в .env")
+
+    if HAS_UVLOOP:
+        # Политику нужно поставить до run_polling: PTB создаёт цикл событий через неё
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop")
+
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(_on_startup)
+        .post_shutdown(_on_shutdown)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .connection_pool_size(BOT_API_POOL_SIZE)
+        .pool_timeout(BOT_API_POOL_TIMEOUT)
+        .build()
+    )
+
+    application.add_handlers(list(HANDLERS))
 
     logger.info("Travel bot starting (polling)...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_polling(
+        allowed_updates=ALLOWED_UPDATES,
+        timeout=POLL_TIMEOUT,
+        poll_interval=0,
+        bootstrap_retries=-1,
+    )
 
 
 if __name__ == "__main__":